@@ -3,21 +3,34 @@ import logging
 import os
 from pathlib import Path
 
-from toolkit.hyp3 import HyP3Client
-from toolkit.insar import (
-    clip_hyp3_products_to_common_overlap,
-    get_common_overlap,
-    interactive_timeseries_viewer,
-    plot_velocity_geographic,
-    wkt_to_utm_bounds,
-)
-from toolkit.search import read_ids_from_file, sbas_pairs, stack_from_ids
+from toolkit.cli import DEFAULT_MAX_WORKERS, build_parser
 
 logger = logging.getLogger(__name__)
 asf_logger = logging.getLogger("asf_search")
 asf_logger.setLevel(logging.WARNING)
 
 
+def limit_max_workers(max_workers: int) -> int:
+    """
+    Cap the number of download workers well below the open file limit
+
+    Each download holds a socket and an open file.
+    """
+    try:
+        fd_limit = os.sysconf("SC_OPEN_MAX")
+    except (AttributeError, ValueError, OSError):
+        fd_limit = -1
+    if fd_limit > 0 and max_workers > fd_limit // 4:
+        logger.warning(
+            "Reducing --max-workers from %d to %d (open file limit: %d)",
+            max_workers,
+            fd_limit // 4,
+            fd_limit,
+        )
+        max_workers = fd_limit // 4
+    return max_workers
+
+
 def process_insar_command(
     input_file: str,
     project_name: str | None = None,
@@ -29,11 +42,23 @@ def process_insar_command(
     max_temporal_baseline: int = 24,
     dry_run: bool = False,
     wait: bool = True,
+    use_cache: bool = True,
+    refresh_cache: bool = False,
+    max_workers: int = DEFAULT_MAX_WORKERS,
 ):
+    from toolkit.hyp3 import get_client
+    from toolkit.search import (
+        read_ids_from_file,
+        sbas_pairs,
+        stack_from_id_times,
+        stack_from_ids,
+    )
+
     username = os.getenv("HYP3_USERNAME")
     password = os.getenv("HYP3_PASSWORD")
 
-    if not username or not password:
+    # A dry run needs neither credentials nor (usually) the network
+    if not dry_run and (not username or not password):
         logger.error("HYP3_USERNAME and HYP3_PASSWORD environment variables required")
         return
 
@@ -42,26 +67,33 @@ def process_insar_command(
         logger.error("No IDs found in input file")
         return
 
-    logger.info(f"Generating stack from {len(ids)} IDs")
-    stack = stack_from_ids(ids)
+    stack = stack_from_id_times(ids) if dry_run else None
+    if stack is not None:
+        logger.info("Using acquisition times embedded in %d IDs", len(ids))
+        logger.warning("DRY RUN: IDs are not checked against the ASF catalog")
+    else:
+        logger.info("Generating stack from %d IDs", len(ids))
+        stack = stack_from_ids(ids, use_cache=use_cache, refresh_cache=refresh_cache)
 
     logger.info(
-        f"Generating SBAS pairs (temporal baseline: {min_temporal_baseline}-{max_temporal_baseline} days)"
+        "Generating SBAS pairs (temporal baseline: %d-%d days)",
+        min_temporal_baseline,
+        max_temporal_baseline,
     )
     pairs = sbas_pairs(stack, min_temporal_baseline, max_temporal_baseline)
-    logger.info(f"Generated {len(pairs)} pairs")
+    logger.info("Generated %d pairs", len(pairs))
 
     if not pairs:
         logger.error("No pairs generated")
         return
 
     if dry_run:
-        logger.info(f"DRY RUN: Would process {len(pairs)} pairs:")
+        logger.info("DRY RUN: Would process %d pairs:", len(pairs))
         for reference, secondary in pairs:
             print(f"{reference},{secondary}")
         return
 
-    client = HyP3Client(username=username, password=password)
+    client = get_client(username, password)
     client.submit_insar_job(
         pairs=pairs,
         project_name=project_name,
@@ -70,6 +102,7 @@ def process_insar_command(
         looks=looks,
         water_mask=water_mask,
         wait=wait,
+        max_workers=limit_max_workers(max_workers),
     )
 
 
@@ -84,11 +117,23 @@ def process_insar_burst_command(
     max_temporal_baseline: int = 24,
     dry_run: bool = False,
     wait: bool = True,
+    use_cache: bool = True,
+    refresh_cache: bool = False,
+    max_workers: int = DEFAULT_MAX_WORKERS,
 ):
+    from toolkit.hyp3 import get_client
+    from toolkit.search import (
+        read_ids_from_file,
+        sbas_pairs,
+        stack_from_id_times,
+        stack_from_ids,
+    )
+
     username = os.getenv("HYP3_USERNAME")
     password = os.getenv("HYP3_PASSWORD")
 
-    if not username or not password:
+    # A dry run needs neither credentials nor (usually) the network
+    if not dry_run and (not username or not password):
         logger.error("HYP3_USERNAME and HYP3_PASSWORD environment variables required")
         return
 
@@ -97,26 +142,33 @@ def process_insar_burst_command(
         logger.error("No IDs found in input file")
         return
 
-    logger.info(f"Generating stack from {len(ids)} IDs")
-    stack = stack_from_ids(ids)
+    stack = stack_from_id_times(ids) if dry_run else None
+    if stack is not None:
+        logger.info("Using acquisition times embedded in %d IDs", len(ids))
+        logger.warning("DRY RUN: IDs are not checked against the ASF catalog")
+    else:
+        logger.info("Generating stack from %d IDs", len(ids))
+        stack = stack_from_ids(ids, use_cache=use_cache, refresh_cache=refresh_cache)
 
     logger.info(
-        f"Generating SBAS pairs (temporal baseline: {min_temporal_baseline}-{max_temporal_baseline} days)"
+        "Generating SBAS pairs (temporal baseline: %d-%d days)",
+        min_temporal_baseline,
+        max_temporal_baseline,
     )
     pairs = sbas_pairs(stack, min_temporal_baseline, max_temporal_baseline)
-    logger.info(f"Generated {len(pairs)} pairs")
+    logger.info("Generated %d pairs", len(pairs))
 
     if not pairs:
         logger.error("No pairs generated")
         return
 
     if dry_run:
-        logger.info(f"DRY RUN: Would process {len(pairs)} pairs:")
+        logger.info("DRY RUN: Would process %d pairs:", len(pairs))
         for reference, secondary in pairs:
             print(f"{reference},{secondary}")
         return
 
-    client = HyP3Client(username=username, password=password)
+    client = get_client(username, password)
     client.submit_insar_burst_job(
         pairs=pairs,
         project_name=project_name,
@@ -125,14 +177,19 @@ def process_insar_burst_command(
         looks=looks,
         water_mask=water_mask,
         wait=wait,
+        max_workers=limit_max_workers(max_workers),
     )
 
 
 def download_command(
     project_name: str,
     output_dir: str = "data",
-    max_workers: int = 10,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    cog: bool = False,
+    use_cache: bool = True,
 ):
+    from toolkit.hyp3 import get_client
+
     username = os.getenv("HYP3_USERNAME")
     password = os.getenv("HYP3_PASSWORD")
 
@@ -140,30 +197,56 @@ def download_command(
         logger.error("HYP3_USERNAME and HYP3_PASSWORD environment variables required")
         return
 
-    client = HyP3Client(username=username, password=password)
-    logger.info(f"Finding jobs for project: {project_name}")
-    jobs = client.find_jobs(project_name)
+    client = get_client(username, password)
+    logger.info("Finding jobs for project: %s", project_name)
+    jobs = client.find_jobs(project_name, use_cache=use_cache)
 
     if not jobs:
-        logger.warning(f"No jobs found for project: {project_name}")
+        logger.warning("No jobs found for project: %s", project_name)
         return
 
-    logger.info(f"Found {len(jobs)} jobs")
-    client.download(jobs, output_dir=output_dir, max_workers=max_workers)
+    logger.info("Found %d jobs", len(jobs))
+
+    client.download(
+        jobs, output_dir=output_dir, max_workers=limit_max_workers(max_workers)
+    )
+
+    if cog:
+        from toolkit.insar import convert_to_cog
+
+        logger.info("Converting GeoTIFF files in %s to COG", output_dir)
+        convert_to_cog(output_dir)
+        logger.info("COG conversion complete")
 
 
 def clip_command(data_dir: str = "data", wkt: str | None = None):
     from osgeo import gdal, osr
 
+    from toolkit.insar import (
+        clip_hyp3_products_to_common_overlap,
+        get_common_overlap,
+        wkt_to_utm_bounds,
+    )
+
     data_path = Path(data_dir)
-    logger.info(f"Finding DEM files in {data_path}")
-    files = list(data_path.glob("*/*_dem.tif"))
+    logger.info("Finding DEM files in %s", data_path)
+    # Two-level scandir walk (<data_dir>/<product>/*_dem.tif); reuses the dirent
+    # type instead of stat-ing every entry like Path.glob does
+    files = []
+    if data_path.is_dir():
+        files = [
+            Path(entry.path)
+            for product_dir in os.scandir(data_path)
+            if product_dir.is_dir()
+            for entry in os.scandir(product_dir.path)
+            if entry.name.endswith("_dem.tif")
+        ]
 
     if not files:
-        logger.warning(f"No DEM files found in {data_path}")
+        logger.warning("No DEM files found in %s", data_path)
         return
 
-    logger.info(f"Found {len(files)} DEM files")
+    logger.info("Found %d DEM files", len(files))
 
     if wkt:
         logger.info("Using custom WKT geometry for clipping")
@@ -173,17 +256,17 @@ def clip_command(data_dir: str = "data", wkt: str | None = None):
             srs = osr.SpatialReference()
             srs.ImportFromWkt(info["coordinateSystem"]["wkt"])
             target_epsg = int(srs.GetAuthorityCode(None))
-            logger.info(f"Detected coordinate system: EPSG:{target_epsg}")
+            logger.info("Detected coordinate system: EPSG:%d", target_epsg)
 
             overlap = wkt_to_utm_bounds(wkt, target_epsg)
-            logger.info(f"Transformed bounds: {overlap}")
+            logger.info("Transformed bounds: %s", overlap)
         except Exception as e:
-            logger.error(f"Failed to parse WKT or detect coordinate system: {e}")
+            logger.error("Failed to parse WKT or detect coordinate system: %s", e)
             return
     else:
         logger.info("Calculating common overlap")
         overlap = get_common_overlap(files)
-        logger.info(f"Common overlap: {overlap}")
+        logger.info("Common overlap: %s", overlap)
 
     logger.info("Clipping GeoTIFF files to overlap")
     clip_hyp3_products_to_common_overlap(data_path, overlap)
@@ -194,211 +277,50 @@ def visualize_command(
     input_file: str, output: str | None = None, title: str | None = None
 ):
     if not os.path.exists(input_file):
-        logger.error(f"Input file '{input_file}' not found.")
+        logger.error("Input file '%s' not found.", input_file)
         return
 
-    # Determine file type
-    is_velocity = "velocity" in input_file.lower()
+    import matplotlib.pyplot as plt
+
+    from toolkit.insar import (
+        get_dataset_type,
+        interactive_timeseries_viewer,
+        plot_velocity_geographic,
+    )
+
+    # Determine file type from its datasets rather than its name
+    try:
+        dataset_type = get_dataset_type(input_file)
+    except OSError as e:
+        logger.error("Failed to read '%s' as HDF5: %s", input_file, e)
+        return
+
+    if dataset_type is None:
+        logger.error(
+            "'%s' contains neither a 'velocity' nor a 'timeseries' dataset.", input_file
+        )
+        return
 
-    if is_velocity:
+    if dataset_type == "velocity":
         # Plot velocity (static plot)
-        logger.info(f"Visualizing velocity from {input_file}")
-        plot_velocity_geographic(
+        logger.info("Visualizing velocity from %s", input_file)
+        fig, _ = plot_velocity_geographic(
             input_file,
             title=title or "Mean LOS Velocity",
             save_path=output,
         )
+        # Drop the figure's copy of the raster as soon as it is shown or saved
+        plt.close(fig)
     else:
         # Plot timeseries (interactive by default)
         if output:
             logger.warning("--output is not supported in interactive mode. Ignoring.")
-        logger.info(f"Launching interactive timeseries viewer for {input_file}")
+        logger.info("Launching interactive timeseries viewer for %s", input_file)
         interactive_timeseries_viewer(input_file)
 
 
 def parse_args() -> argparse.Namespace:
-    parser = argparse.ArgumentParser(description="ASF Sentinel-1 InSAR Toolkit")
-    subparsers = parser.add_subparsers(dest="command", help="Available commands")
-
-    # Process subcommand with nested subcommands
-    process_parser = subparsers.add_parser("process", help="Process InSAR jobs")
-    process_subparsers = process_parser.add_subparsers(
-        dest="process_type", help="Processing type"
-    )
-
-    # Process InSAR subcommand
-    insar_parser = process_subparsers.add_parser("insar", help="Process InSAR pairs")
-    insar_parser.add_argument(
-        "input_file",
-        type=str,
-        help="Text file containing product IDs (one per line)",
-    )
-    insar_parser.add_argument("--project-name", type=str, help="HyP3 project name")
-    insar_parser.add_argument(
-        "--output-dir",
-        type=str,
-        default="data",
-        help="Output directory (default: data)",
-    )
-    insar_parser.add_argument(
-        "--no-download",
-        action="store_true",
-        default=False,
-        help="Skip downloading processed results",
-    )
-    insar_parser.add_argument(
-        "--water-mask",
-        action="store_true",
-        default=False,
-        help="Apply water mask (default: False)",
-    )
-    insar_parser.add_argument(
-        "--looks",
-        type=str,
-        default="10x2",
-        choices=["10x2", "20x4"],
-        help="Resolution setting (default: 10x2)",
-    )
-    insar_parser.add_argument(
-        "--min-temporal-baseline",
-        type=int,
-        default=0,
-        help="Minimum temporal baseline in days (default: 0)",
-    )
-    insar_parser.add_argument(
-        "--max-temporal-baseline",
-        type=int,
-        default=24,
-        help="Maximum temporal baseline in days (default: 24)",
-    )
-    insar_parser.add_argument(
-        "--dry-run",
-        action="store_true",
-        default=False,
-        help="Show pairs that would be processed without submitting jobs",
-    )
-    insar_parser.add_argument(
-        "--no-wait",
-        action="store_true",
-        default=False,
-        help="Submit jobs without waiting for completion",
-    )
-
-    # Process InSAR Burst subcommand
-    insar_burst_parser = process_subparsers.add_parser(
-        "insar-burst", help="Process InSAR burst pairs"
-    )
-    insar_burst_parser.add_argument(
-        "input_file",
-        type=str,
-        help="Text file containing product IDs (one per line)",
-    )
-    insar_burst_parser.add_argument(
-        "--project-name", type=str, help="HyP3 project name"
-    )
-    insar_burst_parser.add_argument(
-        "--output-dir",
-        type=str,
-        default="data",
-        help="Output directory (default: data)",
-    )
-    insar_burst_parser.add_argument(
-        "--no-download",
-        action="store_true",
-        default=False,
-        help="Skip downloading processed results",
-    )
-    insar_burst_parser.add_argument(
-        "--water-mask",
-        action="store_true",
-        default=False,
-        help="Apply water mask (default: False)",
-    )
-    insar_burst_parser.add_argument(
-        "--looks",
-        type=str,
-        default="5x1",
-        choices=["20x4", "10x2", "5x1"],
-        help="Resolution setting (default: 5x1)",
-    )
-    insar_burst_parser.add_argument(
-        "--min-temporal-baseline",
-        type=int,
-        default=0,
-        help="Minimum temporal baseline in days (default: 0)",
-    )
-    insar_burst_parser.add_argument(
-        "--max-temporal-baseline",
-        type=int,
-        default=24,
-        help="Maximum temporal baseline in days (default: 24)",
-    )
-    insar_burst_parser.add_argument(
-        "--dry-run",
-        action="store_true",
-        default=False,
-        help="Show pairs that would be processed without submitting jobs",
-    )
-    insar_burst_parser.add_argument(
-        "--no-wait",
-        action="store_true",
-        default=False,
-        help="Submit jobs without waiting for completion",
-    )
-
-    # Download subcommand
-    download_parser = subparsers.add_parser(
-        "download", help="Download jobs from a project"
-    )
-    download_parser.add_argument(
-        "--project-name", type=str, required=True, help="Project name to download from"
-    )
-    download_parser.add_argument(
-        "--output-dir",
-        type=str,
-        default="data",
-        help="Output directory (default: data)",
-    )
-    download_parser.add_argument(
-        "--max-workers",
-        type=int,
-        default=10,
-        help="Number of concurrent downloads (default: 10)",
-    )
-
-    # Clip subcommand
-    clip_parser = subparsers.add_parser(
-        "clip", help="Clip GeoTIFF files to common overlap"
-    )
-    clip_parser.add_argument(
-        "--data-dir", type=str, default="data", help="Data directory (default: data)"
-    )
-    clip_parser.add_argument(
-        "--wkt",
-        type=str,
-        default=None,
-        help="Custom WKT geometry string for clipping (e.g., 'POLYGON((...))')",
-    )
-
-    # Visualize subcommand
-    visualize_parser = subparsers.add_parser(
-        "visualize", help="Visualize InSAR timeseries or velocity data"
-    )
-    visualize_parser.add_argument(
-        "input", type=str, help="Input HDF5 file (timeseries.h5 or velocity.h5)"
-    )
-    visualize_parser.add_argument(
-        "--output",
-        "-o",
-        type=str,
-        default=None,
-        help="Output file path to save the figure (e.g., output.png)",
-    )
-    visualize_parser.add_argument(
-        "--title", type=str, default=None, help="Custom plot title"
-    )
-
-    return parser.parse_args()
+    return build_parser().parse_args()
 
 
 if __name__ == "__main__":
@@ -407,31 +329,25 @@ if __name__ == "__main__":
     args = parse_args()
 
     if args.command == "process":
-        if args.process_type == "insar":
-            process_insar_command(
-                input_file=args.input_file,
-                project_name=getattr(args, "project_name", None),
-                output_dir=getattr(args, "output_dir", "data"),
-                download=not getattr(args, "no_download", False),
-                water_mask=getattr(args, "water_mask", False),
-                looks=getattr(args, "looks", "10x2"),
-                min_temporal_baseline=getattr(args, "min_temporal_baseline", 0),
-                max_temporal_baseline=getattr(args, "max_temporal_baseline", 24),
-                dry_run=getattr(args, "dry_run", False),
-                wait=not getattr(args, "no_wait", False),
-            )
-        elif args.process_type == "insar-burst":
-            process_insar_burst_command(
+        process_commands = {
+            "insar": process_insar_command,
+            "insar-burst": process_insar_burst_command,
+        }
+        if args.process_type in process_commands:
+            process_commands[args.process_type](
                 input_file=args.input_file,
-                project_name=getattr(args, "project_name", None),
-                output_dir=getattr(args, "output_dir", "data"),
-                download=not getattr(args, "no_download", False),
-                water_mask=getattr(args, "water_mask", False),
-                looks=getattr(args, "looks", "5x1"),
-                min_temporal_baseline=getattr(args, "min_temporal_baseline", 0),
-                max_temporal_baseline=getattr(args, "max_temporal_baseline", 24),
-                dry_run=getattr(args, "dry_run", False),
-                wait=not getattr(args, "no_wait", False),
+                project_name=args.project_name,
+                output_dir=args.output_dir,
+                download=not args.no_download,
+                water_mask=args.water_mask,
+                looks=args.looks,
+                min_temporal_baseline=args.min_temporal_baseline,
+                max_temporal_baseline=args.max_temporal_baseline,
+                dry_run=args.dry_run,
+                wait=not args.no_wait,
+                use_cache=not args.no_cache,
+                refresh_cache=args.refresh_cache,
+                max_workers=args.max_workers,
             )
         else:
             logger.error(
@@ -442,14 +358,16 @@ if __name__ == "__main__":
             project_name=args.project_name,
             output_dir=args.output_dir,
             max_workers=args.max_workers,
+            cog=args.cog,
+            use_cache=not args.no_cache,
         )
     elif args.command == "clip":
-        clip_command(data_dir=args.data_dir, wkt=getattr(args, "wkt", None))
+        clip_command(data_dir=args.data_dir, wkt=args.wkt)
     elif args.command == "visualize":
         visualize_command(
             input_file=args.input,
-            output=getattr(args, "output", None),
-            title=getattr(args, "title", None),
+            output=args.output,
+            title=args.title,
         )
     else:
         logger.error(
@@ -0,0 +1,78 @@
+"""
+Local on-disk cache for slow remote queries (ASF catalog searches, HyP3 job listings)
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(
+    os.getenv("ASF_TOOLKIT_CACHE_DIR", "~/.cache/asf-toolkit")
+).expanduser()
+DEFAULT_TTL = 6 * 3600
+
+
+def cache_key(*parts: Any) -> str:
+    """
+    Build a stable cache key from the given parts
+    """
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def _cache_path(namespace: str, key: str) -> Path:
+    return CACHE_DIR / namespace / f"{key}.pkl"
+
+
+def load(namespace: str, key: str, ttl: float = DEFAULT_TTL) -> Any | None:
+    """
+    Load a cached value
+
+    Args:
+        namespace: Cache namespace (e.g. the name of the cached function)
+        key: Cache key, see `cache_key`
+        ttl: Maximum age of the cached value in seconds
+
+    Returns:
+        The cached value, or None if missing, expired or unreadable
+    """
+    path = _cache_path(namespace, key)
+    try:
+        if time.time() - path.stat().st_mtime > ttl:
+            return None
+        with open(path, "rb") as f:
+            value = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Ignoring unreadable cache entry %s: %s", path, e)
+        return None
+
+    logger.info("Using cached %s result (%s)", namespace, key[:8])
+    return value
+
+
+def save(namespace: str, key: str, value: Any) -> None:
+    """
+    Store a value in the cache
+
+    Args:
+        namespace: Cache namespace (e.g. the name of the cached function)
+        key: Cache key, see `cache_key`
+        value: Picklable value to store
+    """
+    path = _cache_path(namespace, key)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Failed to write cache entry %s: %s", path, e)
+        tmp_path.unlink(missing_ok=True)
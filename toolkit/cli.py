@@ -0,0 +1,232 @@
+"""
+Command line interface definition
+"""
+
+import argparse
+import functools
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def positive_int(value: str) -> int:
+    """
+    Parse a strictly positive integer (argparse type)
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}") from None
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def max_workers_from_env(default: int = 24) -> int:
+    """
+    Read the default download concurrency from HYP3_MAX_WORKERS
+
+    Blank, non-numeric or non-positive values are ignored with a warning, so a bad
+    environment variable does not break every command at import time.
+    """
+    value = os.getenv("HYP3_MAX_WORKERS", "").strip()
+    if not value:
+        return default
+    try:
+        return positive_int(value)
+    except argparse.ArgumentTypeError as e:
+        logger.warning("Ignoring HYP3_MAX_WORKERS (%s), using %d", e, default)
+        return default
+
+
+DEFAULT_MAX_WORKERS = max_workers_from_env()
+
+# Resolution settings supported by each HyP3 job type
+INSAR_LOOKS = ("10x2", "20x4")
+INSAR_BURST_LOOKS = ("20x4", "10x2", "5x1")
+
+
+def add_common_process_args(
+    parser: argparse.ArgumentParser, looks_choices: tuple[str, ...], default_looks: str
+) -> None:
+    """
+    Add the arguments shared by the InSAR processing subcommands
+
+    Args:
+        parser: The subcommand parser
+        looks_choices: Resolution settings supported by the job type
+        default_looks: Default resolution setting
+    """
+    parser.add_argument(
+        "input_file",
+        type=str,
+        help="Text file containing product IDs (one per line)",
+    )
+    parser.add_argument("--project-name", type=str, help="HyP3 project name")
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        default="data",
+        help="Output directory (default: data)",
+    )
+    parser.add_argument(
+        "--no-download",
+        action="store_true",
+        default=False,
+        help="Skip downloading processed results",
+    )
+    parser.add_argument(
+        "--water-mask",
+        action="store_true",
+        default=False,
+        help="Apply water mask (default: False)",
+    )
+    parser.add_argument(
+        "--looks",
+        type=str,
+        default=default_looks,
+        choices=looks_choices,
+        help=f"Resolution setting (default: {default_looks})",
+    )
+    parser.add_argument(
+        "--min-temporal-baseline",
+        type=int,
+        default=0,
+        help="Minimum temporal baseline in days (default: 0)",
+    )
+    parser.add_argument(
+        "--max-temporal-baseline",
+        type=int,
+        default=24,
+        help="Maximum temporal baseline in days (default: 24)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        default=False,
+        help="Show pairs that would be processed without submitting jobs "
+        "(IDs are not checked against ASF when they embed acquisition times)",
+    )
+    parser.add_argument(
+        "--no-wait",
+        action="store_true",
+        default=False,
+        help="Submit jobs without waiting for completion",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Do not read or write the local search cache",
+    )
+    parser.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        default=False,
+        help="Ignore cached search results and query ASF again",
+    )
+    add_max_workers_arg(parser)
+
+
+def add_max_workers_arg(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the --max-workers argument to a subcommand that downloads products
+    """
+    parser.add_argument(
+        "--max-workers",
+        type=positive_int,
+        default=DEFAULT_MAX_WORKERS,
+        help=f"Maximum number of concurrent downloads (default: {DEFAULT_MAX_WORKERS}, "
+        "override with HYP3_MAX_WORKERS)",
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the argument parser for the toolkit CLI
+    """
+    parser = argparse.ArgumentParser(description="ASF Sentinel-1 InSAR Toolkit")
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    # Process subcommand with nested subcommands
+    process_parser = subparsers.add_parser("process", help="Process InSAR jobs")
+    process_subparsers = process_parser.add_subparsers(
+        dest="process_type", help="Processing type"
+    )
+
+    # Process InSAR subcommand
+    insar_parser = process_subparsers.add_parser("insar", help="Process InSAR pairs")
+    add_common_process_args(
+        insar_parser, looks_choices=INSAR_LOOKS, default_looks="10x2"
+    )
+
+    # Process InSAR Burst subcommand
+    insar_burst_parser = process_subparsers.add_parser(
+        "insar-burst", help="Process InSAR burst pairs"
+    )
+    add_common_process_args(
+        insar_burst_parser, looks_choices=INSAR_BURST_LOOKS, default_looks="5x1"
+    )
+
+    # Download subcommand
+    download_parser = subparsers.add_parser(
+        "download", help="Download jobs from a project"
+    )
+    download_parser.add_argument(
+        "--project-name", type=str, required=True, help="Project name to download from"
+    )
+    download_parser.add_argument(
+        "--output-dir",
+        type=str,
+        default="data",
+        help="Output directory (default: data)",
+    )
+    add_max_workers_arg(download_parser)
+    download_parser.add_argument(
+        "--cog",
+        action="store_true",
+        default=False,
+        help="Convert downloaded GeoTIFF files to Cloud-Optimized GeoTIFFs",
+    )
+    download_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Do not read or write the local job cache",
+    )
+
+    # Clip subcommand
+    clip_parser = subparsers.add_parser(
+        "clip", help="Clip GeoTIFF files to common overlap"
+    )
+    clip_parser.add_argument(
+        "--data-dir", type=str, default="data", help="Data directory (default: data)"
+    )
+    clip_parser.add_argument(
+        "--wkt",
+        type=str,
+        default=None,
+        help="Custom WKT geometry string for clipping (e.g., 'POLYGON((...))')",
+    )
+
+    # Visualize subcommand
+    visualize_parser = subparsers.add_parser(
+        "visualize", help="Visualize InSAR timeseries or velocity data"
+    )
+    visualize_parser.add_argument(
+        "input", type=str, help="Input HDF5 file (timeseries.h5 or velocity.h5)"
+    )
+    visualize_parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default=None,
+        help="Output file path to save the figure (e.g., output.png)",
+    )
+    visualize_parser.add_argument(
+        "--title", type=str, default=None, help="Custom plot title"
+    )
+
+    return parser
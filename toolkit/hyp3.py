@@ -2,13 +2,101 @@
 Comprehensive InSAR processing toolkit
 """
 
+import functools
 import logging
+import os
+import threading
+import time
+from datetime import timedelta
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Literal
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Literal
 from hyp3_sdk import HyP3, Batch, Job
+from hyp3_sdk.exceptions import HyP3Error, HyP3SDKError
 import hyp3_sdk
+import requests
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
+from urllib3.util.retry import Retry
+
+from toolkit import cache
+
+# Maximum number of concurrent requests to the HyP3 API
+MAX_SUBMIT_WORKERS = 16
+
+# Maximum number of jobs HyP3 accepts in one submission request
+SUBMIT_CHUNK_SIZE = 200
+
+# Initial number of concurrent downloads, raised up to max_workers while it pays off
+ADAPTIVE_START_WORKERS = 8
+
+# Maximum number of products unzipped concurrently while downloads continue
+MAX_EXTRACT_WORKERS = min(8, os.cpu_count() or 1)
+
+# Size of the chunks streamed to disk while downloading a product
+DOWNLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+
+# Polling interval while watching jobs, doubled after every poll up to the maximum
+WATCH_MIN_INTERVAL = 10
+WATCH_MAX_INTERVAL = 60
+
+# Remaining credits are reused for this long before asking HyP3 again
+CREDITS_CACHE_TTL = 30
+
+# Credits charged per job, by job type and looks
+JOB_COSTS = {
+    "INSAR_GAMMA": {"10x2": 15, "20x4": 10},
+    "INSAR_ISCE_BURST": {"20x4": 1, "10x2": 1, "5x1": 1},
+}
+
+# Finished jobs never change, so cached job listings can live long
+FIND_JOBS_CACHE_TTL = 7 * 24 * 3600
+
+
+class _AdaptiveLimit:
+    """
+    Concurrency limit that grows by one slot each time throughput improves
+
+    Workers hold a slot (`with limit:`) while they transfer; the coordinating thread
+    reports finished transfers with `record`. Every `window` transfers, the throughput
+    over that window is compared with the best one seen so far, and another slot is
+    opened if it improved by at least `min_gain`.
+    """
+
+    def __init__(
+        self, start: int, maximum: int, window: int = 10, min_gain: float = 0.05
+    ):
+        self.limit = start
+        self.maximum = maximum
+        self.window = window
+        self.min_gain = min_gain
+        self._semaphore = threading.Semaphore(start)
+        self._best_rate = 0.0
+        self._window_bytes = 0
+        self._window_count = 0
+        self._window_start = time.monotonic()
+
+    def __enter__(self):
+        self._semaphore.acquire()
+
+    def __exit__(self, *exc_info):
+        self._semaphore.release()
+
+    def record(self, num_bytes: int) -> None:
+        self._window_bytes += num_bytes
+        self._window_count += 1
+        if self._window_count < self.window:
+            return
+
+        now = time.monotonic()
+        rate = self._window_bytes / max(now - self._window_start, 1e-6)
+        if rate >= self._best_rate * (1 + self.min_gain) and self.limit < self.maximum:
+            self.limit += 1
+            self._semaphore.release()
+        self._best_rate = max(self._best_rate, rate)
+        self._window_bytes = 0
+        self._window_count = 0
+        self._window_start = now
 
 
 class HyP3Client:
@@ -18,8 +106,216 @@ class HyP3Client:
 
     def __init__(self, username: str, password: str):
         self.hyp3 = HyP3(username=username, password=password)
+        self.username = username
         self.logger = logging.getLogger(__name__)
 
+        # Size the keep-alive pool for concurrent API calls; POSTs are never retried
+        adapter = HTTPAdapter(
+            pool_connections=MAX_SUBMIT_WORKERS,
+            pool_maxsize=MAX_SUBMIT_WORKERS,
+            max_retries=Retry(total=3, backoff_factor=0.5),
+        )
+        self.hyp3.session.mount("https://", adapter)
+
+        self._credits = None
+        self._credits_time = 0.0
+
+    def check_credits(self) -> float | int | None:
+        """
+        Get the remaining processing credits, reusing a recent answer from HyP3
+
+        Returns:
+            The remaining credits, as reported by `HyP3.check_credits` at most
+            `CREDITS_CACHE_TTL` seconds ago and less what has been submitted since
+        """
+        if (
+            self._credits is None
+            or time.monotonic() - self._credits_time > CREDITS_CACHE_TTL
+        ):
+            self._credits = self.hyp3.check_credits()
+            self._credits_time = time.monotonic()
+        return self._credits
+
+    def _has_credits(self, cost: int) -> bool:
+        """
+        Check that the remaining credits cover a submission, logging an error if not
+
+        Args:
+            cost: Total credits the submission would be charged
+
+        Returns:
+            Whether the jobs can be submitted
+        """
+        credits = self.check_credits()
+        # HyP3 reports no balance for accounts without a credit limit
+        if credits is not None and cost > credits:
+            self.logger.error(
+                "Not enough credits to submit jobs (need %d, have %s)", cost, credits
+            )
+            return False
+        return True
+
+    def _spend_credits(self, cost: int) -> None:
+        # Track submissions locally instead of querying HyP3 again
+        if self._credits is not None:
+            self._credits -= cost
+
+    def _submit_pairs(
+        self, prepare_job: Callable[..., dict], pairs: list[tuple[str, str]], **kwargs
+    ) -> Batch:
+        """
+        Submit one job per pair, up to `SUBMIT_CHUNK_SIZE` jobs per request
+
+        Jobs are prepared locally and the chunks are submitted concurrently over the
+        client's shared session.
+
+        Args:
+            prepare_job: HyP3 prepare method taking the reference and secondary granules
+            pairs: Reference and secondary granule pairs
+            **kwargs: Job options forwarded to `prepare_job`
+
+        Returns:
+            Batch of the submitted jobs, in the order of `pairs`
+        """
+        prepared_jobs = [
+            prepare_job(reference, secondary, **kwargs)
+            for reference, secondary in pairs
+        ]
+        chunks = [
+            prepared_jobs[i : i + SUBMIT_CHUNK_SIZE]
+            for i in range(0, len(prepared_jobs), SUBMIT_CHUNK_SIZE)
+        ]
+
+        batch = Batch()
+        with ThreadPoolExecutor(
+            max_workers=min(MAX_SUBMIT_WORKERS, len(chunks))
+        ) as executor:
+            for submitted in executor.map(self.hyp3.submit_prepared_jobs, chunks):
+                batch += submitted
+        return batch
+
+    def _iter_completed(self, batch: Batch, timeout: int = 10800):
+        """
+        Poll a batch until all jobs are complete, yielding jobs as they complete
+
+        Unlike `HyP3.watch`, which re-fetches every job one at a time on a fixed
+        interval, only unfinished jobs are polled, concurrently, and the interval backs
+        off from `WATCH_MIN_INTERVAL` to `WATCH_MAX_INTERVAL` seconds.
+
+        Args:
+            batch: Batch of jobs to watch
+            timeout: How long to wait in seconds
+
+        Yields:
+            Lists of the jobs that were found complete in one poll; jobs that are
+            already complete in `batch` come first
+
+        Raises:
+            HyP3Error: If the jobs are not complete within `timeout`
+        """
+        pending = [job for job in batch if not job.complete()]
+        deadline = time.monotonic() + timeout
+        interval = WATCH_MIN_INTERVAL
+
+        with (
+            ThreadPoolExecutor(
+                max_workers=max(1, min(MAX_SUBMIT_WORKERS, len(pending)))
+            ) as executor,
+            tqdm(
+                total=len(batch),
+                initial=len(batch) - len(pending),
+                desc="Waiting for jobs",
+                unit="job",
+            ) as pbar,
+        ):
+            completed = [job for job in batch if job.complete()]
+            if completed:
+                yield completed
+
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise HyP3Error(f"Timeout occurred while waiting for {batch}")
+                # Cut the last sleep short so the final poll happens at the deadline
+                time.sleep(min(interval, remaining))
+                interval = min(interval * 2, WATCH_MAX_INTERVAL)
+
+                refreshed = executor.map(
+                    self.hyp3.get_job_by_id, [job.job_id for job in pending]
+                )
+                pending, completed = [], []
+                for job in refreshed:
+                    (completed if job.complete() else pending).append(job)
+
+                if completed:
+                    pbar.update(len(completed))
+                    yield completed
+
+    def watch(self, batch: Batch, timeout: int = 10800) -> Batch:
+        """
+        Wait until all jobs in a batch are complete
+
+        Args:
+            batch: Batch of jobs to watch
+            timeout: How long to wait in seconds
+
+        Returns:
+            Batch of the refreshed jobs, in the order of `batch`
+        """
+        jobs = {job.job_id: job for job in batch}
+        for completed in self._iter_completed(batch, timeout):
+            for job in completed:
+                jobs[job.job_id] = job
+        return Batch(list(jobs.values()))
+
+    def watch_and_download(
+        self,
+        batch: Batch,
+        output_dir: Path | str = "data",
+        timeout: int = 10800,
+        max_workers: int = 24,
+    ) -> None:
+        """
+        Wait for a batch of jobs, downloading each job's products as soon as it succeeds
+
+        Succeeded jobs are handed to one background downloader as they are found, so
+        they share its session, thread pools and concurrency limit while the remaining
+        jobs are still being watched. Jobs that fail are logged and skipped.
+
+        Args:
+            batch: Batch of jobs to watch
+            output_dir: Directory to save the downloaded files
+            timeout: How long to wait in seconds
+            max_workers: Maximum number of concurrent download threads (default: 24)
+        """
+        failed_jobs = 0
+
+        def succeeded_groups():
+            nonlocal failed_jobs
+            for completed in self._iter_completed(batch, timeout):
+                succeeded = []
+                for job in completed:
+                    if job.succeeded():
+                        succeeded.append(job)
+                    else:
+                        failed_jobs += 1
+                        self.logger.warning(
+                            "Job %s finished as %s, skipping download",
+                            job.job_id,
+                            job.status_code,
+                        )
+                if succeeded:
+                    yield succeeded
+
+        self._download_job_groups(succeeded_groups(), output_dir, max_workers)
+
+        if failed_jobs:
+            self.logger.warning(
+                "%d of %d jobs did not succeed and were not downloaded",
+                failed_jobs,
+                len(batch),
+            )
+
     def submit_insar_job(
         self,
         pairs: list[tuple[str, str]],
@@ -29,6 +325,7 @@ class HyP3Client:
         looks: Literal["10x2", "20x4"] = "10x2",
         water_mask: bool = False,
         wait: bool = True,
+        max_workers: int = 24,
     ) -> None:
         """
         Submit an InSAR job
@@ -38,34 +335,31 @@ class HyP3Client:
             return
 
         # Check if there are enough credits to submit jobs
-        cost_per_pair = 15 if looks == "10x2" else 10
-        total_cost = len(pairs) * cost_per_pair
-        credits = self.hyp3.check_credits()
-        if total_cost > credits:
-            self.logger.error("Not enough credits to submit jobs")
+        total_cost = len(pairs) * JOB_COSTS["INSAR_GAMMA"][looks]
+        if not self._has_credits(total_cost):
             return
 
-        batch = Batch()
-        for reference, secondary in pairs:
-            batch += self.hyp3.submit_insar_job(
-                reference,
-                secondary,
-                name=project_name,
-                include_inc_map=True,
-                looks=looks,
-                apply_water_mask=water_mask,
-                include_wrapped_phase=True,
-                include_displacement_maps=True,
-                # Compatibility with MintPy
-                include_dem=True,
-                include_look_vectors=True,
-            )
+        batch = self._submit_pairs(
+            self.hyp3.prepare_insar_job,
+            pairs,
+            name=project_name,
+            include_inc_map=True,
+            looks=looks,
+            apply_water_mask=water_mask,
+            include_wrapped_phase=True,
+            include_displacement_maps=True,
+            # Compatibility with MintPy
+            include_dem=True,
+            include_look_vectors=True,
+        )
+        self._spend_credits(total_cost)
 
         if wait:
-            batch = self.hyp3.watch(batch)
             if download:
-                self.logger.info("Downloading files to %s", output_dir)
-                batch.download_files(output_dir)
+                self.logger.info("Downloading files to %s as jobs complete", output_dir)
+                self.watch_and_download(batch, output_dir, max_workers=max_workers)
+            else:
+                self.watch(batch)
         else:
             self.logger.info("Jobs submitted. Not waiting for completion.")
             if download:
@@ -83,6 +377,7 @@ class HyP3Client:
         looks: Literal["20x4", "10x2", "5x1"] = "5x1",
         water_mask: bool = False,
         wait: bool = True,
+        max_workers: int = 24,
     ) -> None:
         """
         Submit an InSAR burst job
@@ -92,28 +387,25 @@ class HyP3Client:
             return
 
         # Check if there are enough credits to submit jobs
-        cost_per_pair = 1
-        total_cost = len(pairs) * cost_per_pair
-        credits = self.hyp3.check_credits()
-        if total_cost > credits:
-            self.logger.error("Not enough credits to submit jobs")
+        total_cost = len(pairs) * JOB_COSTS["INSAR_ISCE_BURST"][looks]
+        if not self._has_credits(total_cost):
             return
 
-        batch = Batch()
-        for reference, secondary in pairs:
-            batch += self.hyp3.submit_insar_isce_burst_job(
-                reference,
-                secondary,
-                name=project_name,
-                looks=looks,
-                apply_water_mask=water_mask,
-            )
+        batch = self._submit_pairs(
+            self.hyp3.prepare_insar_isce_burst_job,
+            pairs,
+            name=project_name,
+            looks=looks,
+            apply_water_mask=water_mask,
+        )
+        self._spend_credits(total_cost)
 
         if wait:
-            batch = self.hyp3.watch(batch)
             if download:
-                self.logger.info("Downloading files to %s", output_dir)
-                batch.download_files(output_dir)
+                self.logger.info("Downloading files to %s as jobs complete", output_dir)
+                self.watch_and_download(batch, output_dir, max_workers=max_workers)
+            else:
+                self.watch(batch)
         else:
             self.logger.info("Jobs submitted. Not waiting for completion.")
             if download:
@@ -122,17 +414,86 @@ class HyP3Client:
                     "Use 'download' command later to retrieve results."
                 )
 
-    def find_jobs(self, project_name: str) -> Batch:
+    def find_jobs(self, project_name: str, use_cache: bool = True) -> Batch:
         """
         Find jobs by project name
+
+        Finished (succeeded or failed) jobs are cached on disk, so repeated calls only
+        ask HyP3 for jobs submitted since the oldest job that was still unfinished.
+        Jobs whose products have expired are dropped from the cache.
+
+        Args:
+            project_name: HyP3 project name
+            use_cache: Reuse and update the local job cache
+        """
+        if not use_cache:
+            return self.hyp3.find_jobs(name=project_name)
+
+        key = cache.cache_key(self.username, project_name)
+        cached = cache.load("find_jobs", key, ttl=FIND_JOBS_CACHE_TTL)
+        cached_jobs, cached_watermark = cached if cached is not None else ({}, None)
+        # Expired products can no longer be downloaded, so stop carrying them around
+        jobs = {job_id: job for job_id, job in cached_jobs.items() if not job.expired()}
+
+        # Step back a little in case the API treats `start` as exclusive
+        watermark = cached_watermark
+        start = watermark - timedelta(seconds=1) if watermark is not None else None
+        for job in self.hyp3.find_jobs(name=project_name, start=start):
+            jobs[job.job_id] = job
+
+        unfinished = [job for job in jobs.values() if not job.complete()]
+        if unfinished:
+            watermark = min(job.request_time for job in unfinished)
+        elif jobs:
+            watermark = max(job.request_time for job in jobs.values())
+
+        finished = {job_id: job for job_id, job in jobs.items() if job.complete()}
+        # Rewriting an unchanged entry would restart its TTL and keep it forever
+        if finished.keys() != cached_jobs.keys() or watermark != cached_watermark:
+            cache.save("find_jobs", key, (finished, watermark))
+
+        return Batch(sorted(jobs.values(), key=lambda job: job.request_time))
+
+    def _download_job_files(
+        self, session: requests.Session, job: Job, output_dir: Path | str
+    ) -> list[Path]:
+        """
+        Download the files of a succeeded job over the given session
+
+        Same as `Job.download_files`, except that the SDK opens a new session (and TLS
+        connection) for every file, while this reuses the caller's connection pool.
+
+        Returns:
+            Paths of the downloaded files
         """
-        return self.hyp3.find_jobs(name=project_name)
+        if not job.succeeded():
+            raise HyP3SDKError(
+                f"Only succeeded jobs can be downloaded; job is {job.status_code}."
+            )
+        if job.expired():
+            raise HyP3SDKError(
+                f"Expired jobs cannot be downloaded; job expired {job.expiration_time}."
+            )
+
+        location = Path(output_dir)
+        location.mkdir(parents=True, exist_ok=True)
+
+        paths = []
+        for file in job.files:
+            path = location / file["filename"]
+            with session.get(file["url"], stream=True) as response:
+                response.raise_for_status()
+                with open(path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+            paths.append(path)
+        return paths
 
     def download(
         self,
         jobs: Batch | list[Job],
         output_dir: Path | str = "data",
-        max_workers: int = 10,
+        max_workers: int = 24,
     ) -> None:
         """
         Download jobs to the output directory using multi-threading
@@ -140,38 +501,135 @@ class HyP3Client:
         Args:
             jobs: Batch of jobs to download
             output_dir: Directory to save the downloaded files
-            max_workers: Maximum number of concurrent download threads (default: 10)
+            max_workers: Maximum number of concurrent download threads (default: 24)
         """
-
-        def download_single_job(job: Job) -> bool:
-            try:
-                p = job.download_files(output_dir)
-                p = [hyp3_sdk.util.extract_zipped_product(pp) for pp in p]
-                return True
-            except Exception as e:
-                self.logger.error(f"Failed to download job {job.job_id}: {e}")
-                return False
-
-        job_list = list(jobs) if not isinstance(jobs, list) else jobs
+        job_list = list(jobs)
         if not job_list:
             self.logger.warning("No jobs to download")
             return
+        self._download_job_groups([job_list], output_dir, max_workers)
+
+    def _download_job_groups(
+        self,
+        job_groups: Iterable[list[Job]],
+        output_dir: Path | str,
+        max_workers: int,
+    ) -> None:
+        """
+        Download groups of jobs as they arrive, all through one background downloader
+
+        `job_groups` is consumed in the calling thread, so it may block (e.g. while
+        polling HyP3) while earlier groups download. Each group is handed over as the
+        result of a future that also carries the future of the next group. If
+        `job_groups` raises, the downloads already started finish before the error
+        propagates.
+
+        Args:
+            job_groups: Groups of succeeded jobs to download
+            output_dir: Directory to save the downloaded files
+            max_workers: Maximum number of concurrent download threads
+        """
+        arrival = Future()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            downloader = executor.submit(
+                self._download_arrivals, arrival, output_dir, max_workers
+            )
+            try:
+                for group in job_groups:
+                    following = Future()
+                    arrival.set_result((group, following))
+                    arrival = following
+            except BaseException as e:
+                arrival.set_exception(e)
+                raise
+            arrival.set_result(None)
+            downloader.result()
+
+    def _download_arrivals(
+        self, arrival: Future, output_dir: Path | str, max_workers: int
+    ) -> None:
+        """
+        Download the jobs handed over by `_download_job_groups` until it is done
+
+        Args:
+            arrival: Future of the first `(jobs, next arrival)` pair; None or an
+                exception ends the hand-over
+            output_dir: Directory to save the downloaded files
+            max_workers: Maximum number of concurrent download threads
+        """
+
+        def extract_products(paths: list[Path]) -> None:
+            for path in paths:
+                hyp3_sdk.util.extract_zipped_product(path)
+
+        def product_size(job: Job) -> int:
+            return sum(file.get("size", 0) for file in job.files or [])
 
         failed_downloads = 0
         successful_downloads = 0
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_success = {
-                executor.submit(download_single_job, job): job for job in job_list
-            }
+        # One keep-alive pool shared by all download threads
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=max_workers,
+            pool_maxsize=max_workers,
+            max_retries=Retry(
+                total=5,
+                backoff_factor=0.3,
+                status_forcelist=[429, 500, 502, 503, 504],
+            ),
+        )
+        session.mount("https://", adapter)
+
+        # Start below max_workers and add threads only while throughput keeps rising
+        limit = _AdaptiveLimit(min(ADAPTIVE_START_WORKERS, max_workers), max_workers)
+
+        def download_job(job: Job) -> list[Path]:
+            with limit:
+                return self._download_job_files(session, job, output_dir)
 
-            with tqdm(total=len(job_list), desc="Downloading jobs", unit="job") as pbar:
-                for future in as_completed(future_to_success):
-                    success = future.result()
+        # Downloaded products are unzipped on a separate pool, so extraction never
+        # holds up a download slot; zlib releases the GIL while decompressing
+        with (
+            session,
+            ThreadPoolExecutor(max_workers=max_workers) as download_executor,
+            ThreadPoolExecutor(max_workers=MAX_EXTRACT_WORKERS) as extract_executor,
+            tqdm(total=0, desc="Downloading jobs", unit="job") as pbar,
+        ):
+            pending = {}
+            while pending or arrival is not None:
+                waiting = [*pending, arrival] if arrival is not None else [*pending]
+                done, _ = wait(waiting, return_when=FIRST_COMPLETED)
 
-                    if not success:
+                if arrival in done:
+                    done.remove(arrival)
+                    handed_over = None if arrival.exception() else arrival.result()
+                    arrival = None
+                    if handed_over is not None:
+                        group, arrival = handed_over
+                        pbar.total += len(group)
+                        pbar.refresh()
+                        # Largest products first, so a big download never starts
+                        # last and runs alone
+                        for job in sorted(group, key=product_size, reverse=True):
+                            future = download_executor.submit(download_job, job)
+                            pending[future] = (job, "download")
+
+                for future in done:
+                    job, stage = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self.logger.error(
+                            "Failed to %s job %s: %s", stage, job.job_id, e
+                        )
                         failed_downloads += 1
                     else:
+                        if stage == "download":
+                            limit.record(sum(path.stat().st_size for path in result))
+                            future = extract_executor.submit(extract_products, result)
+                            pending[future] = (job, "extract")
+                            continue
                         successful_downloads += 1
 
                     pbar.update(1)
@@ -183,5 +641,19 @@ class HyP3Client:
                     )
 
         self.logger.info(
-            f"Download complete: {successful_downloads} successful, {failed_downloads} failed"
+            "Download complete: %d successful, %d failed (%d concurrent downloads)",
+            successful_downloads,
+            failed_downloads,
+            limit.limit,
         )
+
+
+@functools.lru_cache(maxsize=1)
+def get_client(username: str, password: str) -> HyP3Client:
+    """
+    Get a HyP3 client for the given credentials
+
+    The client is created once per process, so subcommands run in the same process
+    share its authenticated session and connection pool.
+    """
+    return HyP3Client(username=username, password=password)
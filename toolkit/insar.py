@@ -1,3 +1,7 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import logging
+import os
 from pathlib import Path
 from osgeo import gdal
 import h5py
@@ -7,6 +11,18 @@ from pyproj import Transformer
 from shapely import wkt
 from shapely.ops import transform
 
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=8)
+def get_transformer(src_crs: str, dst_crs: str) -> Transformer:
+    """Get a cached lon/lat-ordered transformer between two coordinate systems
+
+    Building a Transformer resolves the CRS definitions in the PROJ database, which costs
+    far more than transforming the few points or single grid it is used for.
+    """
+    return Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+
 
 def wkt_to_utm_bounds(wkt_string: str, target_epsg: int) -> list[float]:
     """Transform WKT geometry from lat/lon to target coordinate system and extract bounding box
@@ -23,7 +39,7 @@ def wkt_to_utm_bounds(wkt_string: str, target_epsg: int) -> list[float]:
     geometry = wkt.loads(wkt_string)
 
     # Transform from EPSG:4326 to target CRS
-    transformer = Transformer.from_crs("EPSG:4326", f"EPSG:{target_epsg}", always_xy=True)
+    transformer = get_transformer("EPSG:4326", f"EPSG:{target_epsg}")
     geometry_transformed = transform(transformer.transform, geometry)
 
     # Extract bounds and convert to GDAL format
@@ -40,15 +56,58 @@ def get_common_overlap(files: list[str | Path]) -> list[float]:
     Returns:
         [ulx, uly, lrx, lry], the upper-left x, upper-left y, lower-right x, and lower-right y
         corner coordinates of the common overlap
-    """
 
-    corners = [gdal.Info(str(dem), format="json")["cornerCoordinates"] for dem in files]
+    Raises:
+        RuntimeError: If GDAL cannot open one of the files
+    """
 
-    ulx = max(corner["upperLeft"][0] for corner in corners)
-    uly = min(corner["upperLeft"][1] for corner in corners)
-    lrx = min(corner["lowerRight"][0] for corner in corners)
-    lry = max(corner["lowerRight"][1] for corner in corners)
-    return [ulx, uly, lrx, lry]
+    def get_corners(dem: str | Path) -> tuple[float, float, float, float]:
+        # Only the geotransform is needed; gdal.Info would build and parse a full JSON report
+        ds = gdal.Open(str(dem), gdal.GA_ReadOnly)
+        if ds is None:
+            raise RuntimeError(f"GDAL cannot open {dem}")
+        gt = ds.GetGeoTransform()
+        width, height = ds.RasterXSize, ds.RasterYSize
+        ds = None
+        ulx, uly = gt[0], gt[3]
+        lrx = gt[0] + width * gt[1] + height * gt[2]
+        lry = gt[3] + width * gt[4] + height * gt[5]
+        return ulx, uly, lrx, lry
+
+    # GDAL releases the GIL, so reading the files' metadata concurrently pays off
+    with ThreadPoolExecutor() as executor:
+        corners = list(executor.map(get_corners, files))
+
+    ulxs, ulys, lrxs, lrys = zip(*corners)
+    return [max(ulxs), min(ulys), min(lrxs), max(lrys)]
+
+
+# HyP3 product rasters that MintPy reads
+MINTPY_INPUT_SUFFIXES = (
+    "_water_mask.tif",
+    "_corr.tif",
+    "_unw_phase.tif",
+    "_dem.tif",
+    "_lv_theta.tif",
+    "_lv_phi.tif",
+)
+
+# MintPy inputs that hold class labels rather than continuous values
+CATEGORICAL_SUFFIXES = ("_water_mask.tif",)
+
+
+def find_mintpy_inputs(data_dir: str | Path) -> list[Path]:
+    """Find the HyP3 product rasters that MintPy reads in a directory tree
+
+    Clipped copies (`*_clipped.tif`) do not match, since they end in a different suffix.
+    """
+    # One os.walk pass instead of one rglob per suffix; only matches become Paths
+    return [
+        Path(root) / name
+        for root, _, names in os.walk(data_dir)
+        for name in names
+        if name.endswith(MINTPY_INPUT_SUFFIXES)
+    ]
 
 
 def clip_hyp3_products_to_common_overlap(
@@ -64,19 +123,127 @@ def clip_hyp3_products_to_common_overlap(
             corner coordinates of the common overlap
     Returns: None
     """
-    files_for_mintpy = [
-        "_water_mask.tif",
-        "_corr.tif",
-        "_unw_phase.tif",
-        "_dem.tif",
-        "_lv_theta.tif",
-        "_lv_phi.tif",
-    ]
+    files = find_mintpy_inputs(data_dir)
+
+    # The options are the same for every file, so parse them once
+    options = gdal.TranslateOptions(
+        projWin=overlap,
+        creationOptions=["COMPRESS=DEFLATE", "TILED=YES"],
+    )
+
+    def clip(file: Path) -> None:
+        dst_file = file.parent / f"{file.stem}_clipped{file.suffix}"
+        gdal.Translate(destName=str(dst_file), srcDS=str(file), options=options)
 
-    for extension in files_for_mintpy:
-        for file in data_dir.rglob(f"*{extension}"):
-            dst_file = file.parent / f"{file.stem}_clipped{file.suffix}"
-            gdal.Translate(destName=str(dst_file), srcDS=str(file), projWin=overlap)
+    # Each file is clipped independently; GDAL releases the GIL while translating
+    with ThreadPoolExecutor() as executor:
+        list(executor.map(clip, files))
+
+
+def convert_to_cog(data_dir: str | Path) -> None:
+    """Rewrite the HyP3 product rasters in a directory as Cloud-Optimized GeoTIFFs
+
+    The COGs use 256x256 internal tiles (overviews included), DEFLATE compression and
+    averaged overviews (nearest-neighbour for categorical rasters such as the water
+    mask), so later reads (clipping, plotting) only touch the blocks they need. Files
+    that are already COGs are left untouched, and files GDAL cannot read or convert are
+    logged and skipped.
+
+    Args:
+        data_dir:
+            directory containing the HyP3 products to convert
+    Returns: None
+    """
+    files = find_mintpy_inputs(data_dir)
+
+    def convert(file: Path) -> None:
+        ds = gdal.Open(str(file))
+        if ds is None:
+            logger.warning("Skipping %s: GDAL cannot open it", file)
+            return
+        is_cog = ds.GetMetadataItem("LAYOUT", "IMAGE_STRUCTURE") == "COG"
+        ds = None
+        if is_cog:
+            return
+
+        # Averaging categorical values would leave fractional classes in the overviews
+        resampling = (
+            "NEAREST" if file.name.endswith(CATEGORICAL_SUFFIXES) else "AVERAGE"
+        )
+        tmp_file = file.with_suffix(".cog.tmp")
+        out = gdal.Translate(
+            destName=str(tmp_file),
+            srcDS=str(file),
+            format="COG",
+            creationOptions=[
+                "BLOCKSIZE=256",
+                "COMPRESS=DEFLATE",
+                f"OVERVIEW_RESAMPLING={resampling}",
+            ],
+        )
+        if out is None:
+            logger.warning("Skipping %s: conversion to COG failed", file)
+            tmp_file.unlink(missing_ok=True)
+            return
+        # Closing the dataset flushes it to disk before it replaces the original
+        out = None
+        tmp_file.replace(file)
+
+    with ThreadPoolExecutor() as executor:
+        list(executor.map(convert, files))
+
+
+# MintPy attributes used by the plots
+PLOT_METADATA_KEYS = (
+    "X_FIRST",
+    "X_STEP",
+    "Y_FIRST",
+    "Y_STEP",
+    "WIDTH",
+    "LENGTH",
+    "EPSG",
+    "REF_Y",
+    "REF_X",
+    "REF_DATE",
+    "UTM_ZONE",
+    "START_DATE",
+    "END_DATE",
+)
+
+
+def read_plot_metadata(f):
+    """Read only the attributes the plots use from an open MintPy HDF5 file."""
+    return {key: f.attrs[key] for key in PLOT_METADATA_KEYS if key in f.attrs}
+
+
+def read_dates(f):
+    """Read the acquisition dates from an open MintPy timeseries HDF5 file as str."""
+    dates = f["date"][:]
+    # Decode fixed-width byte strings in one vectorized call
+    if dates.dtype.kind == "S":
+        dates = np.char.decode(dates)
+    # Variable-length strings come back as an object array of bytes
+    elif dates.dtype.kind == "O":
+        dates = np.array(
+            [d.decode() if isinstance(d, bytes) else d for d in dates], dtype=str
+        )
+    return dates
+
+
+def _check_date_chunking(dset):
+    # With chunks spanning several dates, reading one date reads all of them
+    chunks = dset.chunks
+    if chunks is not None and chunks[0] > 1:
+        name = dset.name.lstrip("/")
+        logger.warning(
+            "'%s' is chunked as %s, so every date read also reads %d other dates. "
+            "Rechunk it with 'h5repack -l %s:CHUNK=1x%dx%d' for faster access.",
+            name,
+            chunks,
+            chunks[0] - 1,
+            name,
+            *chunks[1:],
+        )
 
 
 def read_timeseries_metadata(timeseries_file):
@@ -86,6 +253,21 @@ def read_timeseries_metadata(timeseries_file):
     return metadata
 
 
+def get_dataset_type(h5_file):
+    """
+    Detect the kind of MintPy product stored in an HDF5 file.
+
+    Returns:
+        "velocity", "timeseries", or None if neither dataset is present
+    """
+    with h5py.File(h5_file, "r") as f:
+        if "velocity" in f:
+            return "velocity"
+        if "timeseries" in f:
+            return "timeseries"
+    return None
+
+
 def get_coordinate_grids(metadata):
     """
     Generate coordinate grids from metadata.
@@ -108,72 +290,206 @@ def get_coordinate_grids(metadata):
     x_utm = x_first + np.arange(width) * x_step
     y_utm = y_first + np.arange(length) * y_step
 
-    # Create 2D meshgrids
-    X_utm, Y_utm = np.meshgrid(x_utm, y_utm)
+    # Broadcast views instead of meshgrids; pyproj copies its inputs into the
+    # output buffers anyway, so materializing the grids only doubled peak memory
+    X_utm = np.broadcast_to(x_utm[np.newaxis, :], (length, width))
+    Y_utm = np.broadcast_to(y_utm[:, np.newaxis], (length, width))
 
     # Transform UTM to lat/lon
-    transformer = Transformer.from_crs(f"EPSG:{epsg}", "EPSG:4326", always_xy=True)
+    transformer = get_transformer(f"EPSG:{epsg}", "EPSG:4326")
     lon, lat = transformer.transform(X_utm, Y_utm)
 
     return x_utm, y_utm, lon, lat
 
 
-def plot_timeseries_geographic(
-    timeseries_file,
-    date_idx=None,
-    figsize=(12, 10),
-    show_colorbar=True,
-    title=None,
-    save_path=None,
-):
+def get_grid_extent(metadata):
     """
-    Plot InSAR timeseries with geographic coordinates.
+    Get the geographic extent of a projected grid from its border pixels.
+
+    Longitude and latitude are monotonic along the grid's rows and columns, so their
+    extremes lie on the border and only the border pixels need to be transformed.
+    The result is cached per grid, so repeated plots of a product reuse it.
+
+    Returns:
+        (lon_min, lon_max, lat_min, lat_max)
+    """
+    return _grid_extent(
+        float(metadata["X_FIRST"]),
+        float(metadata["X_STEP"]),
+        float(metadata["Y_FIRST"]),
+        float(metadata["Y_STEP"]),
+        int(metadata["WIDTH"]),
+        int(metadata["LENGTH"]),
+        int(metadata["EPSG"]),
+    )
+
+
+@lru_cache(maxsize=8)
+def _grid_extent(x_first, x_step, y_first, y_step, width, length, epsg):
+    x_utm = x_first + np.arange(width) * x_step
+    y_utm = y_first + np.arange(length) * y_step
+
+    # Top and bottom rows, then left and right columns
+    border_x = np.concatenate(
+        (x_utm, x_utm, np.full(length, x_utm[0]), np.full(length, x_utm[-1]))
+    )
+    border_y = np.concatenate(
+        (np.full(width, y_utm[0]), np.full(width, y_utm[-1]), y_utm, y_utm)
+    )
+
+    transformer = get_transformer(f"EPSG:{epsg}", "EPSG:4326")
+    lon, lat = transformer.transform(border_x, border_y)
+    return float(lon.min()), float(lon.max()), float(lat.min()), float(lat.max())
+
+
+def get_image_extent(metadata):
+    """
+    Get the imshow extent covering the outer pixel edges of a projected grid.
+
+    The UTM grid is regular, and over the extent of a scene it is close enough to
+    rectilinear in lon/lat to be drawn as an image instead of one quad per pixel.
+
+    Returns:
+        (left, right, bottom, top) in degrees
+    """
+    lon_min, lon_max, lat_min, lat_max = get_grid_extent(metadata)
+    width = int(metadata["WIDTH"])
+    length = int(metadata["LENGTH"])
+    half_lon = (lon_max - lon_min) / max(width - 1, 1) / 2
+    half_lat = (lat_max - lat_min) / max(length - 1, 1) / 2
+    return (
+        lon_min - half_lon,
+        lon_max + half_lon,
+        lat_min - half_lat,
+        lat_max + half_lat,
+    )
+
+
+def get_subsample_step(metadata, max_pixels):
+    """
+    Get the smallest pixel step that brings a grid within a pixel budget.
+
+    Returns:
+        1 if the grid has at most about `max_pixels` pixels, otherwise the step
+        such that every step-th pixel in each direction does
+    """
+    num_pixels = int(metadata["WIDTH"]) * int(metadata["LENGTH"])
+    return max(1, int(np.ceil(np.sqrt(num_pixels / max_pixels))))
+
+
+def subsample_metadata(metadata, step):
+    """
+    Get the metadata of the grid formed by every `step`-th pixel of a grid.
+    """
+    metadata = dict(metadata)
+    metadata["X_STEP"] = float(metadata["X_STEP"]) * step
+    metadata["Y_STEP"] = float(metadata["Y_STEP"]) * step
+    metadata["WIDTH"] = -(-int(metadata["WIDTH"]) // step)
+    metadata["LENGTH"] = -(-int(metadata["LENGTH"]) // step)
+    return metadata
+
+
+def get_reference_lonlat(metadata):
+    """
+    Get the longitude and latitude of the reference pixel (REF_Y, REF_X).
+    """
+    x = float(metadata["X_FIRST"]) + int(metadata["REF_X"]) * float(metadata["X_STEP"])
+    y = float(metadata["Y_FIRST"]) + int(metadata["REF_Y"]) * float(metadata["Y_STEP"])
+    transformer = get_transformer(f"EPSG:{int(metadata['EPSG'])}", "EPSG:4326")
+    return transformer.transform(x, y)
+
+
+def read_displacement(timeseries_file, date_idx=None, max_pixels=4_000_000):
+    """
+    Read one date of an InSAR timeseries for plotting.
 
     Parameters:
         timeseries_file: Path to timeseries.h5 file
-        date_idx: Index of date to plot (default: last date)
-        figsize: Figure size (width, height)
-        show_colorbar: Whether to show colorbar
-        title: Custom title (auto-generated if None)
-        save_path: Path to save figure (None to just display)
+        date_idx: Index of date to read (default: last date)
+        max_pixels: Pixel budget; larger rasters are read subsampled
+
+    Returns:
+        metadata: Plot attributes of the file
+        grid: Metadata of the (possibly subsampled) grid the raster was read on
+        dates: Dates of the timeseries
+        date_idx: Index of the date read
+        displacement_cm: 2D float32 displacement in cm, NaN where invalid
     """
     # Read metadata and data
     with h5py.File(timeseries_file, "r") as f:
-        metadata = dict(f.attrs)
-        dates = f["date"][:]
-        if isinstance(dates[0], bytes):
-            dates = [d.decode() for d in dates]
+        metadata = read_plot_metadata(f)
+        dates = read_dates(f)
 
         # Get date index
         if date_idx is None:
             date_idx = len(dates) - 1
 
-        # Read displacement data (in meters)
-        displacement = f["timeseries"][date_idx, :, :]
+        # Read displacement data (in meters) straight into a float32 buffer,
+        # taking only every step-th pixel of rasters over the pixel budget
+        dset = f["timeseries"]
+        _check_date_chunking(dset)
+        step = get_subsample_step(metadata, max_pixels)
+        grid = subsample_metadata(metadata, step)
+        displacement = np.empty((grid["LENGTH"], grid["WIDTH"]), dtype=np.float32)
+        dset.read_direct(displacement, np.s_[date_idx, ::step, ::step])
 
-    # Convert to cm
-    displacement_cm = displacement * 100
+    # Convert to cm in place; the float32 buffer is ours, so no copy is needed
+    displacement_cm = displacement
+    displacement_cm *= 100
 
-    # Mask invalid data
-    displacement_cm = np.ma.masked_where(displacement_cm == 0, displacement_cm)
+    # Mark invalid data with NaN, which imshow leaves transparent
+    displacement_cm[displacement_cm == 0] = np.nan
 
-    # Get coordinates
-    x_utm, y_utm, lon, lat = get_coordinate_grids(metadata)
+    return metadata, grid, dates, date_idx, displacement_cm
 
-    # Create figure
-    fig, ax = plt.subplots(1, 1, figsize=figsize)
+
+def plot_displacement(
+    metadata,
+    grid,
+    dates,
+    date_idx,
+    displacement_cm,
+    figsize=(12, 10),
+    show_colorbar=True,
+    title=None,
+    save_path=None,
+):
+    """
+    Plot displacement read with `read_displacement` in geographic coordinates.
+
+    Reading and plotting are separate so that callers plotting the same data
+    repeatedly can read it once.
+
+    Parameters:
+        metadata, grid, dates, date_idx, displacement_cm: As returned by
+            `read_displacement`
+        figsize: Figure size (width, height)
+        show_colorbar: Whether to show colorbar
+        title: Custom title (auto-generated if None)
+        save_path: Path to save figure (None to just display)
+    """
+    # Get coordinates; only the border and the reference pixel are transformed
+    image_extent = get_image_extent(grid)
+    ref_lon, ref_lat = get_reference_lonlat(metadata)
+
+    # Create figure; constrained layout is solved once, at draw time, instead of
+    # tight_layout running an extra render pass of its own
+    fig, ax = plt.subplots(1, 1, figsize=figsize, layout="constrained")
 
     # Plot with lon/lat coordinates
-    vmin = np.percentile(displacement_cm[~displacement_cm.mask], 2)
-    vmax = np.percentile(displacement_cm[~displacement_cm.mask], 98)
+    vmin, vmax = np.nanpercentile(displacement_cm, [2, 98])
 
-    im = ax.pcolormesh(
-        lon, lat, displacement_cm, cmap="RdYlBu_r", vmin=vmin, vmax=vmax, shading="auto"
+    im = ax.imshow(
+        displacement_cm,
+        cmap="RdYlBu_r",
+        vmin=vmin,
+        vmax=vmax,
+        extent=image_extent,
+        origin="upper" if float(metadata["Y_STEP"]) < 0 else "lower",
+        interpolation="nearest",
     )
 
     # Add reference point
-    ref_lon = lon[int(metadata["REF_Y"]), int(metadata["REF_X"])]
-    ref_lat = lat[int(metadata["REF_Y"]), int(metadata["REF_X"])]
     ax.plot(
         ref_lon,
         ref_lat,
@@ -209,8 +525,9 @@ def plot_timeseries_geographic(
         cbar.set_label("Displacement [cm]", fontsize=12)
 
     # Add coordinate info text
-    lon_range = (lon.min(), lon.max())
-    lat_range = (lat.min(), lat.max())
+    lon_min, lon_max, lat_min, lat_max = get_grid_extent(metadata)
+    lon_range = (lon_min, lon_max)
+    lat_range = (lat_min, lat_max)
     info_text = "Geographic extent:\n"
     info_text += f"Lon: {lon_range[0]:.4f}°E to {lon_range[1]:.4f}°E\n"
     info_text += f"Lat: {lat_range[0]:.4f}°N to {lat_range[1]:.4f}°N\n"
@@ -226,10 +543,8 @@ def plot_timeseries_geographic(
         bbox=dict(boxstyle="round", facecolor="white", alpha=0.8),
     )
 
-    plt.tight_layout()
-
     if save_path:
-        plt.savefig(save_path, dpi=300, bbox_inches="tight")
+        fig.savefig(save_path, dpi=150)
         print(f"Figure saved to: {save_path}")
 
     plt.show()
@@ -237,50 +552,113 @@ def plot_timeseries_geographic(
     return fig, ax
 
 
-def plot_velocity_geographic(
-    velocity_file,
+def plot_timeseries_geographic(
+    timeseries_file,
+    date_idx=None,
     figsize=(12, 10),
-    title="Mean LOS Velocity",
+    show_colorbar=True,
+    title=None,
     save_path=None,
+    max_pixels=4_000_000,
 ):
     """
-    Plot velocity with geographic coordinates.
+    Plot InSAR timeseries with geographic coordinates.
 
     Parameters:
-        velocity_file: Path to velocity.h5 file
+        timeseries_file: Path to timeseries.h5 file
+        date_idx: Index of date to plot (default: last date)
         figsize: Figure size (width, height)
-        title: Plot title
-        save_path: Path to save figure
+        show_colorbar: Whether to show colorbar
+        title: Custom title (auto-generated if None)
+        save_path: Path to save figure (None to just display)
+        max_pixels: Pixel budget; larger rasters are read and drawn subsampled
     """
-    # Read velocity data
-    with h5py.File(velocity_file, "r") as f:
-        metadata = dict(f.attrs)
-        velocity = f["velocity"][:]
+    return plot_displacement(
+        *read_displacement(timeseries_file, date_idx, max_pixels),
+        figsize=figsize,
+        show_colorbar=show_colorbar,
+        title=title,
+        save_path=save_path,
+    )
 
-    # Convert m/year to cm/year
-    velocity_cm = velocity * 100
 
-    # Mask invalid data
-    velocity_cm = np.ma.masked_where(velocity_cm == 0, velocity_cm)
+def read_velocity(velocity_file, max_pixels=4_000_000):
+    """
+    Read a velocity raster for plotting.
 
-    # Get coordinates
-    x_utm, y_utm, lon, lat = get_coordinate_grids(metadata)
+    Parameters:
+        velocity_file: Path to velocity.h5 file
+        max_pixels: Pixel budget; larger rasters are read subsampled
 
-    # Create figure
-    fig, ax = plt.subplots(1, 1, figsize=figsize)
+    Returns:
+        metadata: Plot attributes of the file
+        grid: Metadata of the (possibly subsampled) grid the raster was read on
+        velocity_cm: 2D float32 velocity in cm/year, NaN where invalid
+    """
+    # Read velocity data
+    with h5py.File(velocity_file, "r") as f:
+        metadata = read_plot_metadata(f)
+        # Read straight into a preallocated float32 array, skipping h5py's
+        # intermediate copy; HDF5 converts float64 products on the fly. Rasters
+        # over the pixel budget are read as every step-th pixel
+        dset = f["velocity"]
+        step = get_subsample_step(metadata, max_pixels)
+        grid = subsample_metadata(metadata, step)
+        velocity = np.empty((grid["LENGTH"], grid["WIDTH"]), dtype=np.float32)
+        dset.read_direct(velocity, np.s_[::step, ::step])
+
+    # Convert m/year to cm/year in place
+    velocity_cm = velocity
+    velocity_cm *= 100
+
+    # Mark invalid data with NaN, which imshow leaves transparent
+    velocity_cm[velocity_cm == 0] = np.nan
+
+    return metadata, grid, velocity_cm
+
+
+def plot_velocity(
+    metadata,
+    grid,
+    velocity_cm,
+    figsize=(12, 10),
+    title="Mean LOS Velocity",
+    save_path=None,
+):
+    """
+    Plot velocity read with `read_velocity` in geographic coordinates.
+
+    Parameters:
+        metadata, grid, velocity_cm: As returned by `read_velocity`
+        figsize: Figure size (width, height)
+        title: Plot title
+        save_path: Path to save figure
+    """
+    # Get coordinates; only the border and the reference pixel are transformed
+    image_extent = get_image_extent(grid)
+    ref_lon, ref_lat = get_reference_lonlat(metadata)
+
+    # Create figure; constrained layout is solved once, at draw time, instead of
+    # tight_layout running an extra render pass of its own
+    fig, ax = plt.subplots(1, 1, figsize=figsize, layout="constrained")
 
-    # Auto-scale
-    vmax_abs = np.percentile(np.abs(velocity_cm[~velocity_cm.mask]), 98)
+    # Auto-scale; the absolute values are a temporary that the percentile may
+    # reorder in place instead of copying once more
+    vmax_abs = np.nanpercentile(np.abs(velocity_cm), 98, overwrite_input=True)
     vmin = -vmax_abs
     vmax = vmax_abs
 
-    im = ax.pcolormesh(
-        lon, lat, velocity_cm, cmap="RdYlBu_r", vmin=vmin, vmax=vmax, shading="auto"
+    im = ax.imshow(
+        velocity_cm,
+        cmap="RdYlBu_r",
+        vmin=vmin,
+        vmax=vmax,
+        extent=image_extent,
+        origin="upper" if float(metadata["Y_STEP"]) < 0 else "lower",
+        interpolation="nearest",
     )
 
     # Add reference point
-    ref_lon = lon[int(metadata["REF_Y"]), int(metadata["REF_X"])]
-    ref_lat = lat[int(metadata["REF_Y"]), int(metadata["REF_X"])]
     ax.plot(
         ref_lon,
         ref_lat,
@@ -305,8 +683,9 @@ def plot_velocity_geographic(
     cbar.set_label("Velocity [cm/year]", fontsize=12)
 
     # Add coordinate info
-    lon_range = (lon.min(), lon.max())
-    lat_range = (lat.min(), lat.max())
+    lon_min, lon_max, lat_min, lat_max = get_grid_extent(metadata)
+    lon_range = (lon_min, lon_max)
+    lat_range = (lat_min, lat_max)
     date_range = (
         f"{metadata.get('START_DATE', 'N/A')} - {metadata.get('END_DATE', 'N/A')}"
     )
@@ -324,10 +703,8 @@ def plot_velocity_geographic(
         bbox=dict(boxstyle="round", facecolor="white", alpha=0.8),
     )
 
-    plt.tight_layout()
-
     if save_path:
-        plt.savefig(save_path, dpi=300, bbox_inches="tight")
+        fig.savefig(save_path, dpi=150)
         print(f"Figure saved to: {save_path}")
 
     plt.show()
@@ -335,92 +712,143 @@ def plot_velocity_geographic(
     return fig, ax
 
 
-def interactive_timeseries_viewer(timeseries_file):
+def plot_velocity_geographic(
+    velocity_file,
+    figsize=(12, 10),
+    title="Mean LOS Velocity",
+    save_path=None,
+    max_pixels=4_000_000,
+):
+    """
+    Plot velocity with geographic coordinates.
+
+    Parameters:
+        velocity_file: Path to velocity.h5 file
+        figsize: Figure size (width, height)
+        title: Plot title
+        save_path: Path to save figure
+        max_pixels: Pixel budget; larger rasters are read and drawn subsampled
+    """
+    return plot_velocity(
+        *read_velocity(velocity_file, max_pixels),
+        figsize=figsize,
+        title=title,
+        save_path=save_path,
+    )
+
+
+def interactive_timeseries_viewer(timeseries_file, max_pixels=4_000_000):
     """
     Interactive viewer for timeseries data with slider.
 
     Parameters:
         timeseries_file: Path to timeseries.h5 file
+        max_pixels: Pixel budget; larger rasters are read and drawn subsampled
     """
     from matplotlib.widgets import Slider
 
-    # Read data
-    with h5py.File(timeseries_file, "r") as f:
-        metadata = dict(f.attrs)
-        dates = f["date"][:]
-        if isinstance(dates[0], bytes):
-            dates = [d.decode() for d in dates]
-        timeseries_data = f["timeseries"][:]
-
-    # Convert to cm and mask
-    timeseries_cm = timeseries_data * 100
-    timeseries_cm = np.ma.masked_where(timeseries_cm == 0, timeseries_cm)
-
-    # Get coordinates
-    x_utm, y_utm, lon, lat = get_coordinate_grids(metadata)
-
-    # Create figure
-    fig, ax = plt.subplots(figsize=(12, 10))
-    plt.subplots_adjust(bottom=0.15)
-
-    # Initial plot
-    vmin = np.percentile(timeseries_cm[~timeseries_cm.mask], 2)
-    vmax = np.percentile(timeseries_cm[~timeseries_cm.mask], 98)
-
-    im = ax.pcolormesh(
-        lon,
-        lat,
-        timeseries_cm[0],
-        cmap="RdYlBu_r",
-        vmin=vmin,
-        vmax=vmax,
-        shading="auto",
-    )
-
-    # Reference point
-    ref_lon = lon[int(metadata["REF_Y"]), int(metadata["REF_X"])]
-    ref_lat = lat[int(metadata["REF_Y"]), int(metadata["REF_X"])]
-    ax.plot(
-        ref_lon,
-        ref_lat,
-        "ks",
-        markersize=10,
-        markerfacecolor="black",
-        markeredgecolor="white",
-        markeredgewidth=2,
-        label="Reference Point",
-    )[0]
-
-    ax.set_xlabel("Longitude (°E)", fontsize=12)
-    ax.set_ylabel("Latitude (°N)", fontsize=12)
-    ax.set_aspect("equal")
-    ax.grid(True, alpha=0.3, linestyle="--")
-    ax.legend(loc="upper right")
+    # Keep the file open and read one date at a time instead of the whole cube;
+    # a larger chunk cache keeps chunks spanning several dates from being re-read
+    f = h5py.File(timeseries_file, "r", rdcc_nbytes=64 * 1024 * 1024)
+    try:
+        metadata = read_plot_metadata(f)
+        dates = read_dates(f)
+        timeseries = f["timeseries"]
+        _check_date_chunking(timeseries)
+        step = get_subsample_step(metadata, max_pixels)
+        grid = subsample_metadata(metadata, step)
+
+        @lru_cache(maxsize=16)
+        def read_date(idx):
+            # Each cached date needs its own buffer, so one is allocated per read
+            displacement_cm = np.empty(
+                (grid["LENGTH"], grid["WIDTH"]), dtype=np.float32
+            )
+            timeseries.read_direct(displacement_cm, np.s_[idx, ::step, ::step])
+
+            # Convert to cm and mark invalid data with NaN
+            displacement_cm *= 100
+            displacement_cm[displacement_cm == 0] = np.nan
+            return displacement_cm
+
+        # Get coordinates; only the border and the reference pixel are transformed
+        image_extent = get_image_extent(grid)
+        ref_lon, ref_lat = get_reference_lonlat(metadata)
+
+        # Create figure
+        fig, ax = plt.subplots(figsize=(12, 10))
+        plt.subplots_adjust(bottom=0.15)
+        fig.canvas.mpl_connect("close_event", lambda event: f.close())
+
+        # Color scale from every 4th pixel (or coarser, within the pixel budget) of
+        # a subset of dates, so the whole cube is never loaded; the 2/98
+        # percentiles of the subsample match the full ones closely. Percentiles
+        # scale linearly, so only the two results are converted to cm
+        s = max(4, step)
+        sample = timeseries.astype(np.float32)[:: max(1, len(dates) // 8), ::s, ::s]
+        valid = sample[sample != 0]
+        vmin, vmax = np.percentile(valid, [2, 98], overwrite_input=True) * 100
+
+        # Initial plot
+        im = ax.imshow(
+            read_date(0),
+            cmap="RdYlBu_r",
+            vmin=vmin,
+            vmax=vmax,
+            extent=image_extent,
+            origin="upper" if float(metadata["Y_STEP"]) < 0 else "lower",
+            interpolation="nearest",
+        )
 
-    ref_date = metadata.get("REF_DATE", dates[0])
-    if isinstance(ref_date, bytes):
-        ref_date = ref_date.decode()
-    title = ax.set_title(
-        f"N = 0, Time = {dates[0]}\nReference: N = 0, Time = {ref_date}",
-        fontsize=14,
-        weight="bold",
-    )
+        # Reference point
+        ax.plot(
+            ref_lon,
+            ref_lat,
+            "ks",
+            markersize=10,
+            markerfacecolor="black",
+            markeredgecolor="white",
+            markeredgewidth=2,
+            label="Reference Point",
+        )[0]
+
+        ax.set_xlabel("Longitude (°E)", fontsize=12)
+        ax.set_ylabel("Latitude (°N)", fontsize=12)
+        ax.set_aspect("equal")
+        ax.grid(True, alpha=0.3, linestyle="--")
+        ax.legend(loc="upper right")
+
+        ref_date = metadata.get("REF_DATE", dates[0])
+        if isinstance(ref_date, bytes):
+            ref_date = ref_date.decode()
+        title = ax.set_title(
+            f"N = 0, Time = {dates[0]}\nReference: N = 0, Time = {ref_date}",
+            fontsize=14,
+            weight="bold",
+        )
 
-    cbar = plt.colorbar(im, ax=ax, orientation="vertical", pad=0.02, shrink=0.8)
-    cbar.set_label("Displacement [cm]", fontsize=12)
+        cbar = plt.colorbar(im, ax=ax, orientation="vertical", pad=0.02, shrink=0.8)
+        cbar.set_label("Displacement [cm]", fontsize=12)
 
-    # Slider
-    ax_slider = plt.axes([0.15, 0.05, 0.7, 0.03])
-    slider = Slider(ax_slider, "Image", 0, len(dates) - 1, valinit=0, valstep=1)
+        # Slider
+        ax_slider = plt.axes([0.15, 0.05, 0.7, 0.03])
+        slider = Slider(ax_slider, "Image", 0, len(dates) - 1, valinit=0, valstep=1)
 
-    def update(val):
-        idx = int(slider.val)
-        im.set_array(timeseries_cm[idx].ravel())
-        title.set_text(
-            f"N = {idx}, Time = {dates[idx]}\nReference: N = 0, Time = {ref_date}"
-        )
-        fig.canvas.draw_idle()
+        def update(val):
+            idx = int(slider.val)
+            im.set_data(read_date(idx))
+            title.set_text(
+                f"N = {idx}, Time = {dates[idx]}\nReference: N = 0, Time = {ref_date}"
+            )
+            fig.canvas.draw_idle()
 
-    slider.on_changed(update)
+        slider.on_changed(update)
+    except BaseException:
+        f.close()
+        raise
 
     plt.show()
+    # In interactive mode show() returns while the window is still open, and the close
+    # event releases the file; otherwise the viewer is done with it by now
+    if not (plt.isinteractive() and plt.fignum_exists(fig.number)):
+        f.close()
@@ -6,16 +6,60 @@ References:
 - https://github.com/asfadmin/Discovery-asf_search/blob/master/examples/0-Intro.md
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import logging
 from pathlib import Path
+import re
+import threading
 
 import asf_search as asf
+import numpy as np
 import pandas as pd
 from dateutil.parser import parse as parse_date
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from toolkit import cache
 
 logger = logging.getLogger(__name__)
 
+PRODUCT_SEARCH_CHUNK_SIZE = 250
+PRODUCT_SEARCH_MAX_WORKERS = 8
+
+# Acquisition start time embedded in Sentinel-1 scene and burst names
+ACQUISITION_TIME_RE = re.compile(r"_(\d{8}T\d{6})_")
+
+# Suffix ASF appends to SLC scene names to form their fileID. Burst products keep
+# their -BURST suffix in sceneName, and HyP3 burst jobs are submitted with it
+SLC_FILE_ID_SUFFIX_RE = re.compile(r"-SLC$")
+
+# Search result properties kept in stacks (sbas_pairs needs sceneName and startTime)
+STACK_COLUMNS = ("sceneName", "fileID", "frameNumber", "pathNumber", "startTime")
+BASELINE_COLUMNS = STACK_COLUMNS + ("temporalBaseline", "perpendicularBaseline")
+
+_local = threading.local()
+
+
+def get_session() -> asf.ASFSession:
+    """
+    Get the ASF session of the calling thread, creating it on first use
+
+    asf_search keeps CMR paging state in the session headers, so concurrent
+    searches must not share a session; each thread reuses its own connection pool.
+
+    Returns:
+        The thread's ASF session
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = asf.ASFSession()
+        # asf_search retries 5xx responses itself; only retry failed connections here
+        adapter = HTTPAdapter(max_retries=Retry(connect=3, backoff_factor=0.3))
+        session.mount("https://", adapter)
+        _local.session = session
+    return session
+
 
 def read_ids_from_file(file_path: str) -> list[str]:
     """
@@ -25,52 +69,74 @@ def read_ids_from_file(file_path: str) -> list[str]:
         file_path: Path to text file containing product IDs (one per line)
 
     Returns:
-        List of product IDs
+        List of unique product IDs, in the order they first appear
     """
-    ids = []
     path = Path(file_path)
 
     if not path.exists():
-        logger.error(f"File not found: {file_path}")
-        return ids
-
-    with open(path) as f:
-        for line_num, line in enumerate(f, 1):
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
+        logger.error("File not found: %s", file_path)
+        return []
 
-            ids.append(line)
+    # Read and split the whole file in one go; only surviving IDs are decoded
+    with open(path, "rb") as f:
+        lines = [line.strip() for line in f.read().splitlines()]
+    lines = [line for line in lines if line and not line.startswith(b"#")]
+    num_lines = len(lines)
+    ids = dict.fromkeys(line.decode() for line in lines)
 
-    logger.info(f"Read {len(ids)} IDs from {file_path}")
-    return ids
+    if num_lines > len(ids):
+        logger.info("Skipped %d duplicate IDs", num_lines - len(ids))
+    logger.info("Read %d IDs from %s", len(ids), file_path)
+    return list(ids)
 
 
 def search_result_to_df(
     search_results: asf.ASFSearchResults,
+    columns: tuple[str, ...] | None = None,
 ) -> pd.DataFrame:
     """
     Convert a list of search results to a pandas DataFrame
+
+    Args:
+        search_results: The search results
+        columns: Properties to keep, or None for every property plus geometry
+
+    Returns:
+        A pandas DataFrame with one row per search result
     """
-    columns = list(search_results[0].properties.keys()) + [
-        "geometry",
-    ]
-    data = [
-        list(scene.properties.values())
-        + [
-            scene.geometry,
+    if columns is None:
+        columns = (*search_results[0].properties, "geometry")
+
+    # Build one list per column rather than one list per row
+    data = {
+        key: [
+            scene.geometry if key == "geometry" else scene.properties.get(key)
+            for scene in search_results
         ]
-        for scene in search_results
-    ]
-    df = pd.DataFrame(data, columns=columns)
-    df["startTime"] = df.startTime.apply(parse_date)
+        for key in columns
+    }
+    df = pd.DataFrame(data, copy=False)
+    if "startTime" in df:
+        df["startTime"] = pd.to_datetime(df["startTime"], utc=True, format="ISO8601")
     return df
 
 
+def _parse_utc_date(value: str) -> datetime:
+    # ISO 8601 strings take the fast path; anything else falls back to dateutil
+    try:
+        date = datetime.fromisoformat(value)
+    except ValueError:
+        date = parse_date(value)
+    return date.replace(tzinfo=timezone.utc)
+
+
 def baseline_search(
     reference_id: str,
     start_date: datetime | str | None = None,
     end_date: datetime | str | None = None,
+    use_cache: bool = True,
+    refresh_cache: bool = False,
+    session: asf.ASFSession | None = None,
 ) -> pd.DataFrame:
     """
     Search for baselines with a reference ID
@@ -79,42 +145,143 @@ def baseline_search(
         reference_id: The ID of the reference granule
         start_date: The start date of the search
         end_date: The end date of the search
+        use_cache: Reuse a recent result of the same search from the local cache
+        refresh_cache: Ignore any cached result and query ASF again
+        session: The ASF session to search with, defaults to `get_session()`
     Returns:
         A pandas DataFrame of the search results
     """
     if isinstance(start_date, str):
-        start_date = parse_date(start_date).replace(tzinfo=timezone.utc)
+        start_date = _parse_utc_date(start_date)
     if isinstance(end_date, str):
-        end_date = parse_date(end_date).replace(tzinfo=timezone.utc)
+        end_date = _parse_utc_date(end_date)
 
     logger.info("Searching for baselines with reference ID: %s", reference_id)
     logger.info("  Start date: %s", start_date)
     logger.info("  End date: %s", end_date)
 
-    baseline_results = asf.stack_from_id(reference_id)
-
-    stack = search_result_to_df(baseline_results)
-
+    # The unfiltered stack is cached so that different date ranges share one entry
+    key = cache.cache_key(reference_id)
+    stack = None
+    if use_cache and not refresh_cache:
+        stack = cache.load("baseline_search", key)
+    if stack is None:
+        opts = asf.ASFSearchOptions(session=session or get_session())
+        baseline_results = asf.stack_from_id(reference_id, opts=opts)
+        stack = search_result_to_df(baseline_results, columns=BASELINE_COLUMNS)
+        # An empty answer may only mean ASF has not indexed the scene yet
+        if stack.empty:
+            logger.warning("ASF returned no baseline stack for %s", reference_id)
+        elif use_cache:
+            cache.save("baseline_search", key, stack)
+
+    # Combine both bounds into one mask so the stack is only copied once
+    mask = pd.Series(True, index=stack.index)
     if start_date is not None:
-        stack = stack.loc[stack.startTime >= start_date]
+        mask &= stack.startTime >= start_date
     if end_date is not None:
-        stack = stack.loc[stack.startTime <= end_date]
+        mask &= stack.startTime <= end_date
+    stack = stack.loc[mask]
 
     logger.info("Found %d results", len(stack))
     return stack
 
 
+def product_search_chunked(
+    ids: list[str],
+    chunk_size: int = PRODUCT_SEARCH_CHUNK_SIZE,
+    max_workers: int = PRODUCT_SEARCH_MAX_WORKERS,
+    session: asf.ASFSession | None = None,
+) -> asf.ASFSearchResults:
+    """
+    Resolve product IDs with concurrent `asf.product_search` calls on chunks of IDs
+
+    Args:
+        ids: Product IDs to resolve
+        chunk_size: Number of IDs per search request
+        max_workers: Maximum number of concurrent search requests
+        session: The ASF session to search with. Chunks are searched one at a time
+            when given, otherwise each worker thread uses its own `get_session()`
+
+    Returns:
+        The search results, in the same chunk order as `ids`
+    """
+
+    def search_chunk(chunk: list[str]) -> asf.ASFSearchResults:
+        opts = asf.ASFSearchOptions(session=session or get_session())
+        return asf.product_search(product_list=chunk, opts=opts)
+
+    chunks = [ids[i : i + chunk_size] for i in range(0, len(ids), chunk_size)]
+    if len(chunks) <= 1 or session is not None:
+        results = list(map(search_chunk, chunks))
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            results = list(executor.map(search_chunk, chunks))
+    return asf.ASFSearchResults([product for result in results for product in result])
+
+
 def stack_from_ids(
     ids: list[str],
+    use_cache: bool = True,
+    refresh_cache: bool = False,
+    session: asf.ASFSession | None = None,
 ) -> pd.DataFrame:
     """
     Search for stacks from a list of IDs, and compute temporalBaseline column based on startTime.
+
+    Results are cached locally, see `toolkit.cache`. Pass `use_cache=False` to bypass the
+    cache entirely, or `refresh_cache=True` to query ASF again and overwrite the cached result.
+    """
+    key = cache.cache_key(tuple(sorted(ids)))
+    stack = None
+    if use_cache and not refresh_cache:
+        stack = cache.load("stack_from_ids", key)
+    if stack is None:
+        baseline_results = product_search_chunked(ids, session=session)
+
+        # Convert to DataFrame
+        stack = search_result_to_df(baseline_results, columns=STACK_COLUMNS)
+        # An empty answer may only mean ASF has not indexed the products yet
+        if stack.empty:
+            logger.warning("ASF returned no products for the %d IDs", len(ids))
+        elif use_cache:
+            cache.save("stack_from_ids", key, stack)
+
+    stack = _add_temporal_baseline(stack)
+
+    logger.info("Found %d results", len(stack))
+    return stack
+
+
+def stack_from_id_times(ids: list[str]) -> pd.DataFrame | None:
     """
-    baseline_results = asf.product_search(product_list=ids)
+    Build a stack from the acquisition times embedded in the product IDs, without querying ASF.
 
-    # Convert to DataFrame
-    stack = search_result_to_df(baseline_results)
+    The IDs are not checked against the ASF catalog, so IDs that ASF cannot resolve
+    are not reported. The -SLC suffix of SLC fileIDs is stripped to match ASF's
+    sceneName; burst IDs are used unchanged, since their sceneName keeps -BURST.
 
+    Args:
+        ids: Sentinel-1 scene or burst names, e.g. S1_270858_IW2_20220105T093220_VV_B35D-BURST
+
+    Returns:
+        A pandas DataFrame with sceneName, startTime and temporalBaseline columns,
+        or None if any ID has no embedded acquisition time
+    """
+    names = []
+    times = []
+    for product_id in ids:
+        match = ACQUISITION_TIME_RE.search(product_id)
+        if match is None:
+            return None
+        names.append(SLC_FILE_ID_SUFFIX_RE.sub("", product_id))
+        times.append(datetime.strptime(match.group(1), "%Y%m%dT%H%M%S"))
+
+    stack = pd.DataFrame({"sceneName": names, "startTime": times})
+    return _add_temporal_baseline(stack)
+
+
+def _add_temporal_baseline(stack: pd.DataFrame) -> pd.DataFrame:
     # Ensure startTime is datetime, but only parse if not already datetime
     stack["startTime"] = pd.to_datetime(stack["startTime"], utc=True)
 
@@ -123,8 +290,6 @@ def stack_from_ids(
     stack["temporalBaseline"] = (stack["startTime"] - min_time).dt.total_seconds() / (
         24 * 3600
     )
-
-    logger.info("Found %d results", len(stack))
     return stack
 
 
@@ -152,19 +317,36 @@ def sbas_pairs(
     if not isinstance(max_temporal_baseline, int) or max_temporal_baseline < 0:
         raise ValueError("max_temporal_baseline must be a positive integer")
 
-    sbas_pairs = set()
-
-    for reference, rt in stack.loc[::-1, ["sceneName", "temporalBaseline"]].itertuples(
-        index=False
-    ):
-        secondaries = stack.loc[
-            (stack.sceneName != reference)
-            & (stack.temporalBaseline - rt <= max_temporal_baseline)
-            & (stack.temporalBaseline - rt > min_temporal_baseline)
-        ]
-        for secondary in secondaries.sceneName:
-            sbas_pairs.add((reference, secondary))
-
-    pairs = list(sbas_pairs)
-    pairs.sort(key=lambda x: x[0])
-    return pairs
+    # With one row per scene every (i, j) pair is unique, and dt > 0 excludes i == j
+    stack = stack.drop_duplicates("sceneName")
+    names = stack["sceneName"].to_numpy()
+    baselines = stack["temporalBaseline"].to_numpy(dtype=float)
+
+    # Instead of an N x N mask, find each reference's secondaries as a contiguous
+    # window of the baseline-sorted scenes; memory grows with the number of pairs.
+    # The window is padded slightly so float rounding in b + min vs. b_j - b_i
+    # cannot drop a pair, and the exact dt test below removes the extras
+    order = np.argsort(baselines, kind="stable")
+    sorted_baselines = baselines[order]
+    lo = np.searchsorted(sorted_baselines, baselines + min_temporal_baseline - 1e-6)
+    hi = np.searchsorted(
+        sorted_baselines, baselines + max_temporal_baseline + 1e-6, side="right"
+    )
+    counts = np.maximum(hi - lo, 0)
+    ref_idx = np.repeat(np.arange(len(baselines)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    sec_idx = order[np.repeat(lo, counts) + offsets]
+
+    # dt is the temporal baseline from reference to secondary
+    dt = baselines[sec_idx] - baselines[ref_idx]
+    keep = (dt > min_temporal_baseline) & (dt <= max_temporal_baseline)
+    ref_idx, sec_idx = ref_idx[keep], sec_idx[keep]
+
+    # Order pairs by reference name, then by secondary position in the stack: rank
+    # the N names once and sort on integer keys instead of name strings
+    rank = np.empty(len(names), dtype=np.intp)
+    rank[np.argsort(names, kind="stable")] = np.arange(len(names))
+    pair_order = np.lexsort((sec_idx, rank[ref_idx]))
+    ref_idx, sec_idx = ref_idx[pair_order], sec_idx[pair_order]
+
+    return list(zip(names[ref_idx].tolist(), names[sec_idx].tolist()))